@@ -1,80 +1,110 @@
+import errno
+import glob
 import logging
 import os
 import re
+import shutil
+import stat
+import threading
 import time
 import unittest
 import uuid
-from typing import Dict, Sequence
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Sequence, Union
+from unittest import mock
 
 from ust.defines import PLATFORM, WINDOWS, UNIX
-from ust.errors import InvalidArgType
-from ust.file import copy, F_FORCE, F_UPDATE, F_IGNORE, F_RECURSIVE, grep, remove
+from ust.errors import FileMoveError, InvalidArgType
+from ust.file import copy, F_FORCE, F_UPDATE, F_IGNORE, F_RECURSIVE, F_PARALLEL, F_RM_EMPTY, grep, remove
+from ust.file import C_BINARY, C_TEXT, cmpdir, cmpfile, move, _cache, _glob_affix, _sig, _parallel_workers, _MAX_WORKERS
 
+GREP_REGEX_STRING = r'o\w'  # the regex passed to grep as a string
+P = re.compile  # the test data holds compiled patterns, only one test passes a string
+FIXTURE_BUFFER = 1 << 20  # the buffer to write and read back fixtures, so larger ones are done by a single syscall
 
+# the root of all the fixtures, computed once for every test class
+if PLATFORM == UNIX:
+    HOME_PATH = os.getenv("HOME")
+elif PLATFORM == WINDOWS:
+    HOME_PATH = os.getenv("USERPROFILE")
+else:
+    assert False, "Unknown platform"
+ROOT = os.path.join(HOME_PATH, "tmp")
+
+
+@lru_cache(maxsize=128)
 def str2timestamp(s: str) -> float:
     return time.mktime(time.strptime(s, "%Y-%m-%d %H:%M:%S"))
 
 
+@lru_cache(maxsize=128)
 def timestamp2str(t: float) -> str:
     return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
 
 
 def get_uuid():
     # Generate a random UUID
-    return str(uuid.uuid4())
+    return uuid.uuid4().hex
+
+
+def encode_contents(data: Union[Dict, list]) -> None:
+    # encode the contents of the test data once, when the test class is defined, so they are written as is
+    for item in (data.values() if isinstance(data, dict) else data):
+        if isinstance(item, (dict, list)):
+            encode_contents(item)
+    if isinstance(data, dict) and isinstance(data.get('content'), str):
+        data['content'] = data['content'].encode('utf-8')
+
+
+def write_fixture(filepath: str, content: Union[str, bytes]) -> None:
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    if len(data) < FIXTURE_BUFFER:
+        # small fixtures are written by a single syscall, without building a text file object
+        fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+    else:
+        with open(filepath, 'wb', buffering=FIXTURE_BUFFER) as fp:
+            fp.write(data)
 
 
 def is_sequence_same(s1: Sequence, s2: Sequence) -> bool:
-    if len(s1) != len(s2):
-        return False
-    # sum the hash code
-    hash1 = 0
-    hash2 = 0
-    for c1, c2 in zip(s1, s2):
-        hash1 += hash(c1)
-        hash2 += hash(c2)
-    return hash1 == hash2
+    # same elements regardless of order
+    return Counter(s1) == Counter(s2)
 
 
 class BasicCopyTest(unittest.TestCase):
-    if PLATFORM == UNIX:
-        HomePath = os.getenv("HOME")
-    elif PLATFORM == WINDOWS:
-        HomePath = os.getenv("USERPROFILE")
-    else:
-        assert False, "Unknown platform"
-
-    Root = os.path.join(HomePath, "tmp")
     Data = {}
 
     def tearDown(self):
-        if os.path.exists(self.Root):
-            import shutil
-            shutil.rmtree(self.Root)
+        shutil.rmtree(ROOT, ignore_errors=True)
 
-    def generate(self, testdata: Dict) -> str:
+    @classmethod
+    def generate(cls, testdata: Dict) -> str:
         filename = testdata.get("filename")
-        filepath = os.path.join(self.Root, filename)
+        filepath = os.path.join(ROOT, filename)
 
-        if not os.path.exists(filepath):
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
 
         if filepath.endswith('\\') or filepath.endswith("/"):
             os.makedirs(filepath, exist_ok=True)
             return filepath
 
-        with open(filepath, 'w', encoding='utf-8') as fp:
-            fp.write(testdata.get("content", ""))
-            logging.info("Write file: %s", filepath)
-            logging.info("Content: %s", testdata.get("content"))
+        write_fixture(filepath, testdata.get("content", b""))
+        logging.info("Write file: %s", filepath)
+        logging.info("Content: %s", testdata.get("content"))
         if 'mtime' in testdata:
-            os.utime(filepath, (str2timestamp(testdata.get("mtime")), str2timestamp(testdata.get("mtime"))))
+            timestamp = str2timestamp(testdata.get("mtime"))
+            os.utime(filepath, (timestamp, timestamp))
         return filepath
 
-    def readfile(self, filename: str) -> str:
-        if self.Root not in filename:
-            filename = os.path.join(self.Root, filename)
-        with open(filename, 'r', encoding='utf-8') as fp:
+    def readfile(self, filename: str) -> bytes:
+        # filename must be an absolute path, e.g. joined with ROOT
+        with open(filename, 'rb', buffering=FIXTURE_BUFFER) as fp:
             return fp.read()
 
 
@@ -154,6 +184,7 @@ class TestCopyFile(BasicCopyTest):
         },
     }
 
+    encode_contents(Data)
     # end region
 
     def test_copyfile_when_dest_not_exists(self):
@@ -163,8 +194,8 @@ class TestCopyFile(BasicCopyTest):
 
         copy(src, dest)
 
-        content = self.readfile(testdata.get('expected').get('filename'))
-        assert content == testdata.get("src").get("content")
+        content = self.readfile(os.path.join(ROOT, testdata.get('expected').get('filename')))
+        self.assertEqual(content, testdata.get("src").get("content"))
 
     def test_force_copyfile_when_dest_exists(self):
         testdata = self.Data.get("cp -f")
@@ -173,8 +204,8 @@ class TestCopyFile(BasicCopyTest):
 
         copy(src, dest, mode=F_FORCE)
 
-        content = self.readfile(testdata.get('expected').get('filename'))
-        assert content == testdata.get("src").get("content")
+        content = self.readfile(os.path.join(ROOT, testdata.get('expected').get('filename')))
+        self.assertEqual(content, testdata.get("src").get("content"))
 
     def test_update_copyfile_when_dest_exists(self):
         testdata = self.Data.get("cp -u")
@@ -182,12 +213,12 @@ class TestCopyFile(BasicCopyTest):
         dest = self.generate(testdata.get('dest'))
 
         copy(src, dest, mode=F_UPDATE)
-        expect = os.path.join(self.Root, testdata.get('expected').get('filename'))
+        expect = os.path.join(ROOT, testdata.get('expected').get('filename'))
         content = self.readfile(expect)
-        assert content == testdata.get("src").get("content")
+        self.assertEqual(content, testdata.get("src").get("content"))
 
         expect_time = timestamp2str(os.path.getmtime(expect))
-        assert expect_time == testdata.get("src").get("mtime")
+        self.assertEqual(expect_time, testdata.get("src").get("mtime"))
 
     def test_update_failed_copyfile_when_dest_exists(self):
         testdata = self.Data.get("cp -u failed")
@@ -196,12 +227,12 @@ class TestCopyFile(BasicCopyTest):
 
         copy(src, dest, mode=F_UPDATE)
 
-        expect = os.path.join(self.Root, testdata.get('expected').get('filename'))
+        expect = os.path.join(ROOT, testdata.get('expected').get('filename'))
         content = self.readfile(expect)
-        assert content == testdata.get("dest").get("content")
+        self.assertEqual(content, testdata.get("dest").get("content"))
 
         expect_time = timestamp2str(os.path.getmtime(expect))
-        assert expect_time == testdata.get("dest").get("mtime")
+        self.assertEqual(expect_time, testdata.get("dest").get("mtime"))
 
     def test_ignore_copyfile_when_dest_exists(self):
         testdata = self.Data.get("cp -i")
@@ -210,8 +241,40 @@ class TestCopyFile(BasicCopyTest):
 
         copy(src, dest, mode=F_IGNORE)
 
-        content = self.readfile(testdata.get('expected').get('filename'))
-        assert content == testdata.get("dest").get("content")
+        content = self.readfile(os.path.join(ROOT, testdata.get('expected').get('filename')))
+        self.assertEqual(content, testdata.get("dest").get("content"))
+
+    def test_copyfile_when_src_readonly(self):
+        testdata = self.Data.get("cp")
+        src = self.generate(testdata.get("src"))
+        dest = self.generate(testdata.get('dest'))
+        os.chmod(src, stat.S_IRUSR)
+
+        copy(src, dest)
+
+        content = self.readfile(os.path.join(ROOT, testdata.get('expected').get('filename')))
+        self.assertEqual(content, testdata.get("src").get("content"))
+
+    def test_force_copytree_when_dest_has_brackets(self):
+        # '[1]' is a literal part of the name, neither 'dst1' nor the dest itself is globbed
+        src = os.path.dirname(self.generate({'filename': 'source/1.txt', 'content': b'new'}))
+        self.generate({'filename': 'x/dst[1]/old.txt', 'content': b'old'})
+        sibling = self.generate({'filename': 'x/dst1/keep.txt', 'content': b'keep'})
+        dest = os.path.join(ROOT, 'x', 'dst[1]')
+
+        copy(src, dest, mode=F_FORCE)
+
+        self.assertEqual(sorted(os.listdir(dest)), ['1.txt'])
+        self.assertEqual(self.readfile(sibling), b'keep')
+
+    def test_remove_file_with_brackets(self):
+        filepath = self.generate({'filename': 'f[1].txt', 'content': b'x'})
+        sibling = self.generate({'filename': 'f1.txt', 'content': b'x'})
+
+        remove(filepath)
+
+        self.assertFalse(os.path.exists(filepath))
+        self.assertTrue(os.path.exists(sibling))
 
 
 class TestRecurCopyFile(BasicCopyTest):
@@ -257,40 +320,79 @@ class TestRecurCopyFile(BasicCopyTest):
             },
         }
     }
+    encode_contents(Data)
 
     def generate(self, testdata: Dict) -> str:
-        basedir = os.path.join(self.Root, testdata.get("basedir"))
+        basedir = os.path.join(ROOT, testdata.get("basedir"))
         file_items = testdata.get("files")
 
-        for item in file_items:
-            filepath = os.path.join(self.Root, basedir, item.get("filename"))
-
-            if not os.path.exists(filepath):
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        # create each parent directory once, rather than once per file
+        dirs = {os.path.dirname(os.path.join(basedir, item.get("filename"))) for item in file_items}
+        for directory in dirs:
+            os.makedirs(directory, exist_ok=True)
 
-            with open(filepath, 'w', encoding='utf-8') as fp:
-                fp.write(item.get("content", ""))
-                logging.info("Write file: %s", filepath)
-                logging.info("Content: %s", item.get("content"))
+        for item in file_items:
+            filepath = os.path.join(basedir, item.get("filename"))
+            write_fixture(filepath, item.get("content", b""))
+            logging.info("Write file: %s", filepath)
+            logging.info("Content: %s", item.get("content"))
 
         return basedir
 
-    def test_recursive_force_copyfile_when_dest_exists(self):
+    def assert_recursive_force_copy(self, mode: int) -> None:
         testdata = self.Data.get("cp -rf")
         src = self.generate(testdata.get("src"))
         dst = self.generate(testdata.get('dest'))
         expect = dst
 
-        copy(src, dst, mode=F_FORCE | F_RECURSIVE)
+        copy(src, dst, mode=mode)
 
         cnt = 0
-        for root, folder, files in os.walk(expect):
-            for file in files:
-                filename = os.path.join(root, file)
-                content = self.readfile(filename)
-                assert content == self.readfile(filename.replace(dst, src))
+        srcp, dstp = Path(src), Path(expect)
+        for path in dstp.rglob('*'):
+            if path.is_file():
+                self.assertEqual(path.read_bytes(), (srcp / path.relative_to(dstp)).read_bytes())
                 cnt += 1
-        assert cnt == len(testdata.get("expect").get("files"))
+        self.assertEqual(cnt, len(testdata.get("expect").get("files")))
+
+    def test_recursive_force_copyfile_when_dest_exists(self):
+        self.assert_recursive_force_copy(F_FORCE | F_RECURSIVE)
+
+    def test_parallel_recursive_force_copyfile_when_dest_exists(self):
+        self.assert_recursive_force_copy(F_FORCE | F_RECURSIVE | F_PARALLEL)
+
+    def test_parallel_workers_from_env(self):
+        with mock.patch.dict(os.environ, {"UNIX_UTILS_WORKERS": "3"}):
+            self.assertEqual(_parallel_workers(), 3)
+        for value in ("abc", "-1", "0"):
+            with self.subTest(value=value), mock.patch.dict(os.environ, {"UNIX_UTILS_WORKERS": value}):
+                with self.assertLogs(level=logging.WARNING):
+                    self.assertEqual(_parallel_workers(), _MAX_WORKERS)
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "fifos are posix only")
+    def test_recursive_copy_fifo(self):
+        src = self.generate({"basedir": "source", "files": [{"filename": "1.txt", "content": b"x"}]})
+        os.mkfifo(os.path.join(src, "fifo"))
+        dst = os.path.join(ROOT, "destination")
+        os.makedirs(dst)
+
+        # the fifo is never opened for reading, which would wait for a writer forever
+        copy(src, dst, mode=F_FORCE | F_RECURSIVE)
+
+        self.assertTrue(stat.S_ISFIFO(os.lstat(os.path.join(dst, "fifo")).st_mode))
+        self.assertEqual(self.readfile(os.path.join(dst, "1.txt")), b"x")
+
+    @unittest.skipUnless(PLATFORM == UNIX, "symlinks need a privilege on windows")
+    def test_recursive_copy_dangling_link(self):
+        src = self.generate({"basedir": "source", "files": [{"filename": "1.txt", "content": b"x"}]})
+        os.symlink("missing", os.path.join(src, "dangling"))
+        dst = self.generate({"basedir": "destination", "files": [{"filename": "1.txt", "content": b"y"}]})
+
+        # like 'cp -r', the link is copied itself, its missing target isn't read
+        copy(src, dst, mode=F_FORCE | F_RECURSIVE)
+
+        self.assertEqual(os.readlink(os.path.join(dst, "dangling")), "missing")
+        self.assertEqual(self.readfile(os.path.join(dst, "1.txt")), b"x")
 
 
 class TestGrep(BasicCopyTest):
@@ -298,80 +400,364 @@ class TestGrep(BasicCopyTest):
         "grep file by regex string": {
             "filename": "1.txt",
             "content": "Hello World",
-            "regex": r'o\w',
+            "regex": P(GREP_REGEX_STRING),
             'expect': ['or']
         },
         "grep file by pattern": {
             "filename": "1.txt",
             "content": "Hello World",
-            "regex": re.compile(r'o\s?\w+'),
+            "regex": P(r'o\s?\w+'),
             'expect': ['o World']
         },
         "grep file but file not found": {
             "filename": "1.txt",
             "content": "Hello World",
-            "regex": re.compile(r'o\s?\w+'),
+            "regex": P(r'o\s?\w+'),
             'expect': ['o World']
         },
         'grep file but anchor is a dir': {
             "filename": "tmp/",
             "content": "Hello World",
-            "regex": re.compile(r'o\s?\w+'),
+            "regex": P(r'o\s?\w+'),
             'expect': ['o World']
         },
         'grep file multi': {
             "filename": "1.txt",
             "content": "To be or not to be.",
-            "regex": re.compile(r'[TtOo]{2}'),
+            "regex": P(r'[TtOo]{2}'),
             'expect': ['To', 'to', 'ot']
         },
+        'grep file per line': {
+            "filename": "1.txt",
+            "content": "ab cd\nef gh\n\nij\n",
+            "regex": P(r'^.*$'),
+            'expect': ['ab cd', 'ef gh', '', 'ij']
+        },
+        'grep file long line': {
+            "filename": "1.txt",
+            "content": "a" * (3 << 20) + "or\nor\n",  # a line longer than the blocks grep reads
+            "regex": P(r'a{2}or$'),
+            'expect': ['aaor']
+        },
         'grep string multi': {
             "content": "To be or not to be\n That is a question.",
-            "regex": re.compile(r'[TtOo]{2}'),
+            "regex": P(r'[TtOo]{2}'),
             'expect': ['To', 'to', 'ot']
         }
     }
+    Paths: Dict[str, str] = {}  # key: the key of Data value: the fixture path
+
+    @classmethod
+    def setUpClass(cls):
+        # grep only reads the fixtures, so they are built once for the class, each in its own directory.
+        for index, (key, testdata) in enumerate(cls.Data.items()):
+            if "filename" in testdata:
+                cls.Paths[key] = cls.generate(dict(testdata, filename=os.path.join(str(index), testdata["filename"])))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(ROOT, ignore_errors=True)
+
+    def tearDown(self):
+        pass
 
     def test_grep_file_by_regex_string(self):
         testdata = self.Data.get("grep file by regex string")
-        filepath = self.generate(testdata)
+        filepath = self.Paths.get("grep file by regex string")
 
-        found = grep(filepath, testdata.get("regex"))
+        # the only test of the string regex
+        found = grep(filepath, GREP_REGEX_STRING)
 
         self.assertEqual(found, testdata.get('expect'))
 
     def test_grep_file_by_pattern(self):
         testdata = self.Data.get("grep file by pattern")
-        filepath = self.generate(testdata)
+        filepath = self.Paths.get("grep file by pattern")
         found = grep(filepath, testdata.get("regex"))
 
         self.assertEqual(found, testdata.get('expect'))
 
     def test_grep_file_but_file_not_found(self):
-        testdata = self.Data.get("grep file by pattern")
-        filepath = self.generate(testdata)
+        testdata = self.Data.get("grep file but file not found")
+        filepath = self.Paths.get("grep file but file not found")
         with self.assertRaises(InvalidArgType):
             remove(filepath)
             grep(filepath, testdata.get("regex"))
 
     def test_grep_file_but_is_a_dir(self):
         testdata = self.Data.get("grep file but anchor is a dir")
-        filepath = self.generate(testdata)
+        filepath = self.Paths.get("grep file but anchor is a dir")
         with self.assertRaises(InvalidArgType):
             grep(filepath, testdata.get("regex"))
 
     def test_grep_file_multi(self):
         testdata = self.Data.get("grep file multi")
-        filepath = self.generate(testdata)
+        filepath = self.Paths.get("grep file multi")
         found = grep(filepath, testdata.get("regex"), index=-1)
 
         self.assertTrue(is_sequence_same(found, testdata.get('expect')))
 
+    def test_grep_file_per_line(self):
+        testdata = self.Data.get("grep file per line")
+        filepath = self.Paths.get("grep file per line")
+        self.assertEqual(grep(filepath, testdata.get("regex"), index=-1), testdata.get('expect'))
+        # each line is searched by itself, a match doesn't run into the next line
+        self.assertEqual(grep(filepath, P(r'\w\s\w'), index=-1), ['b c', 'f g'])
+        self.assertEqual(grep(filepath, P(r'[^x]+')), ['ab cd\n', 'ef gh\n', '\n', 'ij\n'])
+
+    def test_grep_file_long_line(self):
+        testdata = self.Data.get("grep file long line")
+        filepath = self.Paths.get("grep file long line")
+        self.assertEqual(grep(filepath, testdata.get("regex"), index=-1), testdata.get('expect'))
+        self.assertEqual(grep(filepath, P(r'^or')), ['or'])
+
     def test_grep_string_multi(self):
         testdata = self.Data.get("grep string multi")
         found = grep(testdata.get('content'), testdata.get('regex'), index=-1)
         self.assertTrue(is_sequence_same(found, testdata.get('expect')))
 
+    def test_grep_string_per_line(self):
+        # no '' after the last line end, and no match running into the next line
+        self.assertEqual(grep("ab cd\nef gh\n", P(r'^.*$'), index=-1), ['ab cd', 'ef gh'])
+        self.assertEqual(grep("ab cd\r\nef gh", P(r'\w\s\w'), index=-1), ['b c', 'f g'])
+        # the lines are split by str.splitlines, so by a form feed as well
+        self.assertEqual(grep("foo bar\x0cbaz", P(r'^baz')), ['baz'])
+
+
+class TestGlob(BasicCopyTest):
+    Files = ['a.txt', 'b.txt', '.h.txt', '.txt', 'txt', 'ab.txtx', 'd/x.txt', 'd/.y.txt']
+
+    @unittest.skipIf(PLATFORM == WINDOWS, "windows always uses glob.glob")
+    def test_glob_affix_same_as_glob(self):
+        for filename in self.Files:
+            self.generate({'filename': os.path.join('glob', filename)})
+        base = os.path.join(ROOT, 'glob')
+        cwd = os.getcwd()
+        os.chdir(base)
+        try:
+            for pattern in ('*.txt', '*', '.*', 'a*', '*txt', 'd/*', 'd/.*', '*.none', 'missing/*.txt',
+                            os.path.join(base, '*.txt'), os.path.join(base, 'd', '*')):
+                with self.subTest(pattern=pattern):
+                    found = _glob_affix(pattern)
+                    self.assertIsNotNone(found)
+                    self.assertEqual(sorted(found), sorted(glob.glob(pattern)))
+            # a '*' followed by a separator, or anything else, is left to glob.glob
+            for pattern in ('*/x.txt', 'd*/*', 'a*t', '?.txt', '[ab].txt', '**'):
+                with self.subTest(pattern=pattern):
+                    self.assertIsNone(_glob_affix(pattern))
+        finally:
+            os.chdir(cwd)
+
+
+class TestMove(BasicCopyTest):
+    def test_move_file_over_file(self):
+        src = self.generate({'filename': 'a/1.txt', 'content': b'src'})
+        dest = self.generate({'filename': 'b/1.txt', 'content': b'dest'})
+
+        move(src, dest, mode=F_FORCE)
+
+        self.assertFalse(os.path.exists(src))
+        self.assertEqual(self.readfile(dest), b'src')
+
+    def test_move_file_into_dir(self):
+        src = self.generate({'filename': 'a/1.txt', 'content': b'src'})
+        dest = self.generate({'filename': 'b/'})
+
+        move(src, dest)
+
+        self.assertFalse(os.path.exists(src))
+        self.assertEqual(self.readfile(os.path.join(dest, '1.txt')), b'src')
+
+    def test_move_dir_over_existing_dir(self):
+        src = os.path.dirname(self.generate({'filename': 'a/sub/1.txt', 'content': b'src'}))
+        dest = os.path.dirname(self.generate({'filename': 'b/sub/2.txt', 'content': b'dest'}))
+
+        move(src, dest, mode=F_FORCE | F_RECURSIVE)
+
+        self.assertFalse(os.path.exists(src))
+        self.assertEqual(sorted(os.listdir(dest)), ['1.txt', '2.txt'])
+
+    def test_move_without_force_when_dest_exists(self):
+        for mode in (F_IGNORE, F_UPDATE):
+            with self.subTest(mode=mode):
+                src = self.generate({'filename': 'a/1.txt', 'content': b'src', 'mtime': '2020-01-02 00:00:00'})
+                dest = self.generate({'filename': 'b/1.txt', 'content': b'dest', 'mtime': '2020-01-01 00:00:00'})
+
+                with self.assertRaises(FileMoveError):
+                    move(src, dest, mode=mode)
+
+                self.assertEqual(self.readfile(src), b'src')
+                self.assertEqual(self.readfile(dest), b'dest')
+
+    def test_move_without_force_when_dest_not_exists(self):
+        for mode in (F_IGNORE, F_UPDATE):
+            with self.subTest(mode=mode):
+                src = self.generate({'filename': 'a/1.txt', 'content': b'src'})
+                dest = os.path.join(ROOT, 'b', f'{mode}.txt')
+
+                move(src, dest, mode=mode)
+
+                self.assertFalse(os.path.exists(src))
+                self.assertEqual(self.readfile(dest), b'src')
+
+    def test_move_across_devices(self):
+        src = self.generate({'filename': 'a/1.txt', 'content': b'src'})
+        dest = self.generate({'filename': 'b/1.txt', 'content': b'dest'})
+
+        # the rename fails like on another filesystem, so the file is copied then removed
+        with mock.patch('ust.file.os.replace', side_effect=OSError(errno.EXDEV, os.strerror(errno.EXDEV))) as rename:
+            move(src, dest, mode=F_FORCE)
+
+        rename.assert_called_once()
+        self.assertFalse(os.path.exists(src))
+        self.assertEqual(self.readfile(dest), b'src')
+
+    def test_move_file_over_file_in_same_dir(self):
+        src = self.generate({'filename': 'a/1.txt', 'content': b'src'})
+        dest = self.generate({'filename': 'a/2.txt', 'content': b'dest'})
+
+        move(src, dest, mode=F_FORCE)
+
+        self.assertFalse(os.path.exists(src))
+        self.assertEqual(self.readfile(dest), b'src')
+
+    def test_move_file_in_same_dir_when_dest_not_exists(self):
+        src = self.generate({'filename': 'a/1.txt', 'content': b'src'})
+        dest = os.path.join(ROOT, 'a', '2.txt')
+
+        move(src, dest)
+
+        self.assertFalse(os.path.exists(src))
+        self.assertEqual(self.readfile(dest), b'src')
+
+    def test_move_dir_over_dir_in_same_dir(self):
+        src = os.path.dirname(self.generate({'filename': 'a/src/1.txt', 'content': b'src'}))
+        dest = os.path.dirname(self.generate({'filename': 'a/dest/2.txt', 'content': b'dest'}))
+
+        # a rename can't replace a directory that isn't empty, so dest is removed first
+        move(src, dest, mode=F_FORCE | F_RECURSIVE)
+
+        self.assertFalse(os.path.exists(src))
+        self.assertEqual(os.listdir(dest), ['1.txt'])
+
+
+class TestRemove(BasicCopyTest):
+    def generate_tree(self) -> str:
+        for filename in ('1.txt', 'sub/2.txt', 'sub/inner/3.txt', 'sub/inner/deep/4.txt', 'other/5.txt'):
+            self.generate({'filename': os.path.join('tree', filename), 'content': filename})
+        return os.path.join(ROOT, 'tree')
+
+    def test_parallel_remove_tree(self):
+        tree = self.generate_tree()
+
+        remove(tree, mode=F_PARALLEL)
+
+        self.assertFalse(os.path.exists(tree))
+
+    def test_parallel_remove_tree_raises(self):
+        tree = self.generate_tree()
+
+        # an unlink failing in a worker is raised by remove, rather than lost in the pool
+        with mock.patch('ust.file.os.unlink', side_effect=PermissionError(errno.EACCES, "Permission denied")):
+            with self.assertRaises(PermissionError):
+                remove(tree, mode=F_PARALLEL)
+
+        self.assertTrue(os.path.exists(os.path.join(tree, '1.txt')))
+
+    def test_remove_empty_dir(self):
+        empty_dir = os.path.join(ROOT, 'empty')
+        os.makedirs(empty_dir)
+
+        remove(empty_dir, mode=F_RM_EMPTY)
+
+        self.assertFalse(os.path.exists(empty_dir))
+
+
+class TestCompare(BasicCopyTest):
+    def generate_tree(self, basedir: str, count: int) -> str:
+        for index in range(count):
+            self.generate({'filename': os.path.join(basedir, str(index % 4), f'{index}.txt'), 'content': str(index)})
+        return os.path.join(ROOT, basedir)
+
+    def generate_same_age(self, filename: str, content: bytes) -> str:
+        return self.generate({'filename': filename, 'content': content, 'mtime': '2020-01-01 00:00:00'})
+
+    def test_cmpfile_when_content_changes(self):
+        file1 = self.generate_same_age('1.txt', b'same')
+        file2 = self.generate_same_age('2.txt', b'same')
+        self.assertTrue(cmpfile(file1, file2, C_BINARY))
+
+        # the same size, only the mtime tells the cached outcome is stale
+        write_fixture(file2, b'diff')
+        os.utime(file2, (str2timestamp('2020-01-02 00:00:00'),) * 2)
+
+        self.assertFalse(cmpfile(file1, file2, C_BINARY))
+
+    def test_cmpfile_when_file_swapped(self):
+        file1 = self.generate_same_age('1.txt', b'same')
+        file2 = self.generate_same_age('2.txt', b'same')
+        other = self.generate_same_age('3.txt', b'diff')
+        self.assertTrue(cmpfile(file1, file2, C_BINARY))
+
+        # the same type, size and mtime, only the inode tells file2 is another file now
+        os.replace(other, file2)
+
+        self.assertFalse(cmpfile(file1, file2, C_BINARY))
+
+    def test_cmpfile_same_inode(self):
+        file1 = self.generate_same_age('1.txt', b'same')
+        link = os.path.join(ROOT, 'link.txt')
+        os.link(file1, link)
+        _cache.clear()
+
+        # the same path or inode returns before any file is read, so nothing is cached
+        for mode in (C_BINARY, C_TEXT):
+            with self.subTest(mode=mode):
+                self.assertTrue(cmpfile(file1, file1, mode))
+                self.assertTrue(cmpfile(file1, link, mode))
+        self.assertEqual(len(_cache), 0)
+
+    def test_cmpfile_when_inode_unsupported(self):
+        file1 = self.generate_same_age('1.txt', b'same')
+        file2 = self.generate_same_age('2.txt', b'diff')
+
+        # an st_ino of 0 on both files doesn't tell they are the same file
+        with mock.patch('ust.file._sig', side_effect=lambda file: _sig(file)[:3] + (0, 0)):
+            self.assertFalse(cmpfile(file1, file2, C_BINARY))
+
+    def test_cache_cleared_by_copy_and_remove(self):
+        file1 = self.generate_same_age('1.txt', b'same')
+        file2 = self.generate_same_age('2.txt', b'same')
+
+        for operation in (lambda: copy(file1, os.path.join(ROOT, 'copied.txt')),
+                          lambda: remove(os.path.join(ROOT, 'copied.txt'))):
+            self.assertTrue(cmpfile(file1, file2, C_BINARY))
+            self.assertTrue(_cache)
+            operation()
+            self.assertFalse(_cache)
+
+    def test_parallel_cmpdir_while_copying(self):
+        dir1, dir2 = self.generate_tree('dir1', 64), self.generate_tree('dir2', 64)
+        src = self.generate({'filename': 'other/1.txt', 'content': b'x'})
+        errors = []
+
+        def copy_again() -> None:
+            # every copy drops the cache the compares are reading and filling
+            try:
+                for index in range(200):
+                    copy(src, os.path.join(ROOT, 'other', f'{index % 8}.copy'))
+            except Exception as err:  # pylint: disable=broad-except
+                errors.append(err)
+
+        thread = threading.Thread(target=copy_again)
+        thread.start()
+        try:
+            for _ in range(20):
+                self.assertTrue(cmpdir(dir1, dir2, C_BINARY | F_PARALLEL))
+        finally:
+            thread.join()
+        self.assertEqual(errors, [])
+
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.DEBUG)
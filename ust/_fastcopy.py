@@ -0,0 +1,163 @@
+"""
+This module provides the data copy of regular files for the file operations.
+
+The native copy of each platform is used when possible:
+    Windows: CopyFileExW.
+    macOS: fcopyfile(3) with the data, xattrs and ACLs.
+    Linux: copy_file_range(2) then sendfile(2), which move the data in kernel space.
+            If the optional 'pyuring' package is installed, large files are copied through io_uring first.
+Otherwise, it falls back to a userspace copy with a large buffer.
+Like shutil.copy2, the metadata is copied as well.
+
+Functions:
+    copy_data(src: str, dest: str) -> None:
+        Copies the data and metadata of a regular file.
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import shutil
+import stat
+import sys
+from typing import Callable
+
+try:
+    import pyuring as _uring
+except (ImportError, OSError):  # not installed, or its native library can't be loaded
+    _uring = None
+
+COPY_CHUNK = 1 << 30  # the max bytes per copy_file_range/sendfile call
+COPY_BUFFER = 1 << 20  # the buffer size of the userspace copy
+URING_MIN_SIZE = 1 << 20  # smaller files aren't worth setting up a ring
+
+_COPYFILE_ACL = 1 << 0
+_COPYFILE_XATTR = 1 << 2
+_COPYFILE_DATA = 1 << 3
+
+_copy_file_ex = None  # CopyFileExW of windows
+_fcopyfile = None  # fcopyfile of macOS
+try:
+    if sys.platform == "win32":
+        _copy_file_ex = ctypes.WinDLL("kernel32", use_last_error=True).CopyFileExW
+        _copy_file_ex.argtypes = [ctypes.c_wchar_p, ctypes.c_wchar_p,
+                                  ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint32]
+        _copy_file_ex.restype = ctypes.c_int
+    elif sys.platform == "darwin":
+        _fcopyfile = ctypes.CDLL(ctypes.util.find_library("System"), use_errno=True).fcopyfile
+        _fcopyfile.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_uint32]
+        _fcopyfile.restype = ctypes.c_int
+except (OSError, AttributeError):
+    _copy_file_ex = _fcopyfile = None
+
+# errors mean the kernel or filesystem doesn't support a fast path
+_UNSUPPORTED_ERRNOS = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSOCK}
+_O_BINARY = getattr(os, "O_BINARY", 0)
+# opening a fifo for reading blocks until a writer comes, a regular file ignores the flag
+_O_NONBLOCK = getattr(os, "O_NONBLOCK", 0)
+
+
+def _copy_loop(step: Callable[[], int]) -> bool:
+    """Calls step until it returns 0.
+
+    Args:
+        step (Callable[[], int]): The copy call, returns the bytes copied.
+
+    Raises:
+        OSError: If step fails after some bytes are copied, or fails with an unexpected error.
+
+    Returns:
+        bool: True if any byte is copied, False if nothing is copied or the fast path is unsupported.
+    """
+    copied = 0
+    try:
+        while True:
+            sent = step()
+            if not sent:
+                return copied > 0
+            copied += sent
+    except OSError as err:
+        if copied or err.errno not in _UNSUPPORTED_ERRNOS:
+            raise
+        return False
+
+
+def _copy_fds(in_fd: int, out_fd: int) -> None:
+    """Copies all the data from in_fd to out_fd.
+
+    A fast path that copies nothing falls through to the next one,
+    so files reporting a wrong size such as those in procfs are still copied.
+
+    Args:
+        in_fd (int): The source file descriptor.
+        out_fd (int): The destination file descriptor.
+
+    Returns:
+        None
+    """
+    if _fcopyfile is not None:
+        if _fcopyfile(in_fd, out_fd, None, _COPYFILE_DATA | _COPYFILE_XATTR | _COPYFILE_ACL) == 0:
+            return
+        err = ctypes.get_errno()
+        if err not in _UNSUPPORTED_ERRNOS:
+            raise OSError(err, os.strerror(err))
+        # start over, whatever fcopyfile has written
+        os.lseek(in_fd, 0, os.SEEK_SET)
+        os.lseek(out_fd, 0, os.SEEK_SET)
+        os.ftruncate(out_fd, 0)
+    if hasattr(os, "copy_file_range") and _copy_loop(lambda: os.copy_file_range(in_fd, out_fd, COPY_CHUNK)):
+        return
+    # sendfile only accepts a socket as out_fd on macOS
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux") and \
+            _copy_loop(lambda: os.sendfile(out_fd, in_fd, None, COPY_CHUNK)):
+        return
+    if hasattr(os, "posix_fadvise"):
+        # the userspace copy reads src once from start to end, let the kernel read ahead aggressively
+        os.posix_fadvise(in_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    with open(in_fd, 'rb', closefd=False) as fsrc, open(out_fd, 'wb', closefd=False) as fdst:
+        shutil.copyfileobj(fsrc, fdst, COPY_BUFFER)
+
+
+def copy_data(src: str, dest: str) -> None:
+    """Copies the data and metadata of a regular file, like shutil.copy2 but dest must be a file path.
+
+    Args:
+        src (str): The source file path.
+        dest (str): The destination file path.
+
+    Raises:
+        shutil.SpecialFileError: If src isn't a regular file, such as a fifo or a device.
+        OSError: If the file can't be copied.
+
+    Returns:
+        None
+    """
+    if _copy_file_ex is not None:
+        if not _copy_file_ex(src, dest, None, None, None, 0):
+            raise ctypes.WinError(ctypes.get_last_error())
+        shutil.copystat(src, dest)
+        return
+
+    if _uring is not None and os.stat(src).st_size >= URING_MIN_SIZE:
+        try:
+            _uring.copy(src, dest, mode="fast")
+        except OSError as err:  # e.g. the kernel is older than 5.15, dest is rewritten below
+            logging.debug("Can't copy '%s' by io_uring: %s" % (src, err))
+        else:
+            shutil.copystat(src, dest)
+            return
+
+    in_fd = os.open(src, os.O_RDONLY | _O_BINARY | _O_NONBLOCK)
+    try:
+        # a fifo or a device never ends, check it before any data is copied
+        if not stat.S_ISREG(os.fstat(in_fd).st_mode):
+            raise shutil.SpecialFileError(f"'{src}' is not a regular file")
+        out_fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, 0o666)
+        try:
+            _copy_fds(in_fd, out_fd)
+        finally:
+            os.close(out_fd)
+    finally:
+        os.close(in_fd)
+    shutil.copystat(src, dest)
@@ -0,0 +1,79 @@
+"""
+This module provides an optional Hyperscan prefilter for grep.
+
+When the optional 'hyperscan' package is installed, a pattern is also compiled into a Hyperscan database
+with HS_FLAG_PREFILTER, which may report more matches than the pattern but never less.
+A block of text the database doesn't match can be skipped without running the backtracking 're' engine on it,
+and the blocks it does match are still searched by 're', so the results don't change.
+
+Functions:
+    prefilter(pattern: re.Pattern) -> Optional[Callable[[str], bool]]:
+        Returns a function telling whether a block of text may match pattern, or None if it can't be built.
+"""
+import functools
+import logging
+import re
+import threading
+from typing import Callable, Optional
+
+try:
+    import hyperscan as _hs
+except (ImportError, OSError):  # not installed, or its native library can't be loaded
+    _hs = None
+
+HAS_HYPERSCAN = _hs is not None
+
+
+def _on_match(*args) -> None:
+    """The match handler of hyperscan, the last of args is the list to record the match in."""
+    args[-1].append(True)
+
+
+@functools.lru_cache(maxsize=256)
+def prefilter(pattern: re.Pattern) -> Optional[Callable[[str], bool]]:
+    """Builds the Hyperscan prefilter of pattern once.
+
+    The database is scanned in block mode, each thread scans with a scratch space of its own.
+
+    Args:
+        pattern (re.Pattern): The str pattern of grep.
+
+    Returns:
+        Optional[Callable[[str], bool]]: A function returns False if a block of text can't match the pattern,
+            or None if hyperscan isn't installed or can't compile the pattern.
+    """
+    if _hs is None or not isinstance(pattern.pattern, str) or pattern.flags & re.VERBOSE:
+        return None
+    if "{," in pattern.pattern:  # 're' reads '{,n}' as '{0,n}', but PCRE syntax as literal chars
+        return None
+    if any(anchor in pattern.pattern for anchor in (r"\A", r"\Z", r"\z")):
+        # grep matches them at each line, but hyperscan only at the ends of a block
+        return None
+    flags = _hs.HS_FLAG_PREFILTER | _hs.HS_FLAG_SINGLEMATCH | _hs.HS_FLAG_ALLOWEMPTY | \
+        _hs.HS_FLAG_MULTILINE | _hs.HS_FLAG_UTF8
+    if not pattern.flags & re.ASCII:
+        flags |= _hs.HS_FLAG_UCP
+    if pattern.flags & re.IGNORECASE:
+        flags |= _hs.HS_FLAG_CASELESS
+    if pattern.flags & re.DOTALL:
+        flags |= _hs.HS_FLAG_DOTALL
+
+    database = _hs.Database(mode=_hs.HS_MODE_BLOCK)
+    try:
+        database.compile(expressions=[pattern.pattern.encode('utf-8')], ids=[0], elements=1, flags=[flags])
+    except _hs.error as err:  # syntax hyperscan doesn't support, even as a prefilter
+        logging.debug("Can't compile '%s' by hyperscan: %s" % (pattern.pattern, err))
+        return None
+
+    local = threading.local()  # a scratch space is used by one scan at a time
+
+    def may_match(block: str) -> bool:
+        matched = []  # filled by _on_match
+        scratch = getattr(local, "scratch", None)
+        if scratch is None:
+            scratch = local.scratch = _hs.Scratch(database)
+        database.scan(block.encode('utf-8', errors='ignore'), match_event_handler=_on_match, context=matched,
+                      scratch=scratch)
+        return bool(matched)
+
+    return may_match
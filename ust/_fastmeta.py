@@ -0,0 +1,62 @@
+"""
+This module provides cheap file type probes for the file operations.
+
+The type is read by a single os.stat, or os.lstat when symlinks aren't followed,
+and a missing path is reported as T_MISSING rather than raised.
+
+Functions:
+    stat_or_none(path: str, follow_symlinks: bool = True) -> Optional[os.stat_result]:
+        Returns the stat of a path, or None if it is not found.
+    file_type(path: str, follow_symlinks: bool = True) -> int:
+        Returns one of T_MISSING, T_FILE, T_DIR, T_LINK and T_OTHER for a path.
+"""
+import os
+import stat
+from typing import Optional
+
+T_MISSING = 0  # path not found
+T_FILE = 1  # regular file
+T_DIR = 2  # directory
+T_LINK = 3  # symbolic link, only when follow_symlinks is False
+T_OTHER = 4  # fifo, socket, device and so on
+
+# key: the S_IFMT bits of st_mode value: the type, the others are T_OTHER
+_IFMT2TYPE = {stat.S_IFREG: T_FILE, stat.S_IFDIR: T_DIR, stat.S_IFLNK: T_LINK}
+
+
+def stat_or_none(path: str, follow_symlinks: bool = True) -> Optional[os.stat_result]:
+    """Gets the stat of path, or None if it is not found.
+
+    Args:
+        path (str): The path to probe.
+        follow_symlinks (bool, optional): Whether to follow symlinks, like os.stat. Defaults to True.
+
+    Raises:
+        OSError: If the path exists but can't be probed.
+
+    Returns:
+        Optional[os.stat_result]: The stat of path, or None if path or one of its parents is missing.
+    """
+    try:
+        return os.stat(path) if follow_symlinks else os.lstat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def file_type(path: str, follow_symlinks: bool = True) -> int:
+    """Gets the type of path.
+
+    Args:
+        path (str): The path to probe.
+        follow_symlinks (bool, optional): Whether to follow symlinks, like os.stat. Defaults to True.
+
+    Raises:
+        OSError: If the path exists but can't be probed.
+
+    Returns:
+        int: One of T_MISSING, T_FILE, T_DIR, T_LINK and T_OTHER.
+    """
+    st = stat_or_none(path, follow_symlinks)
+    if st is None:
+        return T_MISSING
+    return _IFMT2TYPE.get(stat.S_IFMT(st.st_mode), T_OTHER)
@@ -14,18 +14,27 @@ Functions:
     remove(src: Paths, mode: int = F_NOSET) -> None:
         Removes a file or directory from a source path.
 """
+import errno
+import functools
 import glob
+import io
 import logging
 import os
 import re
 import shutil
 import stat
-from typing import Callable, Tuple
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator, Optional, Tuple
 from typing import List, Set, Union
 
-from .defines import PLATFORM, WINDOWS, UNIX, WINDOWS_MAX_PATH
+from ._fastcopy import copy_data
+from ._fastgrep import prefilter
+from ._fastmeta import file_type, stat_or_none, T_MISSING, T_FILE, T_DIR, T_LINK
+from .defines import PLATFORM, WINDOWS, WINDOWS_MAX_PATH
 from .errors import FileRemoveError, UnsupportedModeError, FileMoveError, InvalidArgType
-from .path import adaptive, is_filepath
+from .path import adaptive, is_filepath, parallel_walk
 
 # region cp rm mv global defines
 F_NOSET = 0
@@ -39,19 +48,7 @@ F_RM_DIR = 32  # for only remove directory
 F_RM_FILE = 64  # for only remove file
 F_RM_EMPTY = 128  # -d --dir. remove empty
 F_REPLACE = F_FORCE
-
-VALUE2NAME = {
-    F_NOSET: 'F_NOSET',
-    F_FORCE: 'F_FORCE',
-    F_IGNORE: 'F_IGNORE',
-    F_RECURSIVE: 'F_RECURSIVE',
-    F_UPDATE: 'F_UPDATE',
-    F_TARGET_DIRECTORY: 'F_TARGET_DIRECTORY',
-    F_RM_DIR: 'F_RM_DIR',
-    F_RM_FILE: 'F_RM_FILE',
-    F_RM_EMPTY: 'F_RM_EMPTY',
-    F_REPLACE: 'F_REPLACE',
-}
+F_PARALLEL = 8192  # walk and copy, remove or cmpdir with a thread pool, the workers can be set by $UNIX_UTILS_WORKERS
 
 NAME2VALUE = {
     'F_NOSET': F_NOSET,
@@ -63,11 +60,25 @@ NAME2VALUE = {
     'F_RM_DIR': F_RM_DIR,
     'F_RM_FILE': F_RM_FILE,
     'F_RM_EMPTY': F_RM_EMPTY,
-    'F_REPLACE': F_REPLACE
+    'F_REPLACE': F_REPLACE,
+    'F_PARALLEL': F_PARALLEL,
 }
 
+# built from NAME2VALUE backwards, so F_FORCE is named itself rather than by its alias F_REPLACE
+VALUE2NAME = {value: name for name, value in reversed(NAME2VALUE.items())}
+# the name of each flag bit, indexed by bit_length() - 1 of the flag
+FLAG_NAMES = tuple(VALUE2NAME.get(1 << bit, 'Unknown') for bit in range(F_PARALLEL.bit_length()))
+
 Paths = Union[str, List, Set]
 Pattern = Union[str, re.Pattern]
+
+_MAX_WORKERS = min(32, (os.cpu_count() or 4) * 4)  # the default workers of F_PARALLEL
+_WIN_DRIVER_RE = re.compile(r'^[a-zA-Z]+:[/\\]+$')  # such as 'C:\'
+_IS_WINDOWS = PLATFORM == WINDOWS
+_PATH_SEPS = os.sep + (os.altsep or "")  # the separators a directory path may end with
+_GLOB_META = frozenset("*?")  # a path is globbed only with these, so a literal '[' in a name is kept as it is
+_GREP_BLOCK = 1 << 20  # the chars of a file the hyperscan prefilter checks at once, cut at a line end
+_GREP_ENGINES = ("re", "hyperscan")  # "hyperscan" skips the blocks its prefilter can't match, if it is installed
 # endregion cp rm mv global defines
 
 # region cmp global defines
@@ -76,14 +87,42 @@ C_BINARY = 512  # compare file as binaries
 C_TEXT = 1024  # compare file as text
 C_IGNORE_BLANK_LINES = 2048  # skip blank lines when compare text
 C_IGNORE_CASE = 4096  # ignore case when compare text
-BUFFER_SIZE = 1024 * 4  # 1 page
+BUFFER_SIZE = 1 << 20  # the bytes read per syscall when comparing binaries
 
-_CACHE_MAX_LEN = 100  # the max length of _cache
-_cache = {}  # key: Tuple[file1, file2, _sig(file1), _sig(file2)] value: bool
+_CACHE_MAX_LEN = 4096  # the max length of _cache, the least recently used outcome is evicted first
+# key: Tuple[_sig(file1), _sig(file2), mode] value: bool
+# the signatures carry the device and inode, so a file is still found after it is renamed in place.
+_cache: "OrderedDict[Tuple, bool]" = OrderedDict()
+_cache_lock = threading.Lock()  # cmpdir with F_PARALLEL calls cmpfile from many threads
 
 # endregion cmp global defines
 
 
+def _clear_cache() -> None:
+    """Drops the cached outcomes of cmpfile, which may be stale once anything is copied, moved or removed."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def _parallel_workers() -> int:
+    """Gets the workers of F_PARALLEL from $UNIX_UTILS_WORKERS.
+
+    Returns:
+        int: The workers set, or _MAX_WORKERS if it is unset, or not a positive integer.
+    """
+    value = os.getenv("UNIX_UTILS_WORKERS", "")
+    if not value:
+        return _MAX_WORKERS
+    try:
+        workers = int(value)
+    except ValueError:
+        workers = 0
+    if workers > 0:
+        return workers
+    logging.warning("Invalid $UNIX_UTILS_WORKERS '%s', %d workers are used instead." % (value, _MAX_WORKERS))
+    return _MAX_WORKERS
+
+
 def _generate_dirs(path: str) -> None:
     """Generates directories for a given path.
 
@@ -94,7 +133,8 @@ def _generate_dirs(path: str) -> None:
         None
     """
     # generate for '/tmp/not_exist_sub_dir/file' -> '/tmp/not_exist_sub_dir'
-    dirname = os.path.dirname(path)
+    # path is adapted, so splitting on os.sep once is enough
+    dirname = path.rpartition(os.sep)[0]
     if dirname and not os.path.exists(dirname):
         os.makedirs(dirname, exist_ok=True)
         logging.debug("Generate %s ok." % dirname)
@@ -104,27 +144,159 @@ def _generate_dirs(path: str) -> None:
         logging.debug("Generate %s ok." % path)
 
 
-def _copy_by_command(src: str, dest: str) -> None:
-    """Copy file or directory by command.
+# the root check of the platform
+if _IS_WINDOWS:
+    def _check_root(path: str) -> None:
+        """Raises FileRemoveError if path is a windows driver."""
+        if _WIN_DRIVER_RE.match(path):
+            raise FileRemoveError(f"Can't remove windows driver: '{path}'")
+else:
+    def _check_root(path: str) -> None:
+        """Raises FileRemoveError if path is the unix root."""
+        if path.strip() == "/":
+            raise FileRemoveError("Can't remove the unix root '/'")
+
+
+def _copy_data_only(src: str, dest: str) -> None:
+    """Copy the data of a file or directory, when copying it along with the metadata fails.
+
+    Like 'cp -rf', the metadata isn't kept and a dest file that can't be opened is removed and tried again.
+    shutil.copyfile still takes the kernel copy of the platform, and no process is spawned.
 
     Args:
         src (str): The source file or directory path.
-        dest (str): The destination path.
+        dest (str): The destination path, the directory itself rather than its parent for a directory.
+
+    Raises:
+        OSError: If the data can't be copied either.
 
     Returns:
         None
     """
-    if PLATFORM == WINDOWS:
-        if os.path.isdir(src):
-            cmd = f'xcopy "{src}" "{dest}" /s /e /y /k /o /q'
+    logging.info("Copy the data of '%s' to '%s' only." % (src, dest))
+    try:
+        # like 'cp -r', a link is copied itself rather than its target
+        if not stat.S_ISDIR(os.lstat(src).st_mode):
+            _copyfile_data(src, dest)
+            return
+        os.makedirs(dest, exist_ok=True)
+        for dir_entry, dest_path, _ in _walk_dirs_first(_scan_tree(src), dest):
+            _copyfile_data(dir_entry.path, dest_path)
+    except OSError as err:
+        message = f"Can't copy file '{src}' to '{dest}'"
+        # an errno keeps the subclass, e.g. PermissionError when src can't be read
+        raise (OSError(err.errno, message) if err.errno else OSError(message)) from err
+
+
+def _copyfile_data(src: str, dest: str) -> None:
+    """Copy the data of a file, like 'cp -f' it removes dest and tries again if dest can't be opened.
+
+    Like 'cp -r', a symlink or fifo is made again at dest rather than read, and other special files aren't copied.
+    """
+    src_mode = os.lstat(src).st_mode
+    if stat.S_ISLNK(src_mode) or stat.S_ISFIFO(src_mode):
+        if os.path.lexists(dest):
+            os.remove(dest)
+        if stat.S_ISLNK(src_mode):
+            os.symlink(os.readlink(src), dest)
         else:
-            cmd = f'xcopy "{src}" "{dest}" /y /q/ /f'
-    else:
-        cmd = f'cp -rf "{src}" "{dest}"'
-    logging.info("Command: %s " % cmd)
-    code = os.system(cmd)
-    if code != 0:
-        raise OSError(f"Can't copy file '{src}' to '{dest}'")
+            os.mkfifo(dest, stat.S_IMODE(src_mode))
+        return
+    if not stat.S_ISREG(src_mode):
+        raise shutil.SpecialFileError(f"'{src}' is not a regular file")
+    try:
+        shutil.copyfile(src, dest)
+    except PermissionError:
+        if not os.path.lexists(dest):
+            raise
+        os.remove(dest)
+        shutil.copyfile(src, dest)
+
+
+def _dir_prefix(directory: str) -> str:
+    """Returns directory ending with os.sep, so the relative paths of a walk are joined by a concatenation."""
+    # like os.path.join, an empty directory or one ending with any separator is kept as it is
+    return directory if directory[-1:] in _PATH_SEPS else directory + os.sep
+
+
+def _scan_tree(top: str) -> Iterator[Tuple[os.DirEntry, str]]:
+    """Walks a directory tree top-down with os.scandir.
+
+    Like os.walk, symlinks to directories are yielded but not walked into.
+    The entries are yielded as they are, so their cached type and stat can be reused.
+
+    Args:
+        top (str): The directory to walk.
+
+    Returns:
+        Iterator[Tuple[os.DirEntry, str]]: The entries and their paths relative to top.
+    """
+    # carry the relative prefix along with each directory, rather than computing it from the full path
+    stack = [(top, "")]
+    while stack:
+        path, prefix = stack.pop()
+        with os.scandir(path) as it:
+            for dir_entry in it:
+                rel_path = prefix + dir_entry.name
+                yield dir_entry, rel_path
+                if dir_entry.is_dir() and not dir_entry.is_symlink():
+                    stack.append((dir_entry.path, rel_path + os.sep))
+
+
+def _copyfile_entry(dir_entry: os.DirEntry, dest_path: str, mode: int, dest_missing: bool,
+                    policy: "ExistsPolicy") -> None:
+    """Copies a file found by the walk of _copy_recursively.
+
+    Args:
+        dir_entry (os.DirEntry): The source file.
+        dest_path (str): The destination file path.
+        mode (int): The mode of copying.
+        dest_missing (bool): Whether dest_path is known to be missing, e.g. its parent was just created.
+        policy (ExistsPolicy): The dest exists policy of mode, looked up once for the whole walk.
+
+    Returns:
+        None
+    """
+    if dest_missing:
+        # nothing to resolve or check at dest, copy it straight away
+        try:
+            copy_data(dir_entry.path, dest_path)
+        except (shutil.Error, PermissionError, OSError):
+            _copy_data_only(dir_entry.path, dest_path)
+        return
+    # only F_UPDATE needs the mtime of source, DirEntry caches it or gets it for free on windows
+    src_stat = dir_entry.stat() if mode & F_UPDATE else None
+    # the paths are joined from the normalized roots of the walk
+    _copyfile(dir_entry.path, dest_path, mode, src_stat=src_stat, policy=policy, _normalized=True)
+
+
+def _walk_dirs_first(walker: Iterator[Tuple[os.DirEntry, str]], dest: str) -> Iterator[Tuple[os.DirEntry, str, bool]]:
+    """Creates the directories of walker under dest as they are walked, and yields the other entries.
+
+    A directory is always yielded by the walker before its entries,
+    so it exists before any file is copied into it.
+
+    Args:
+        walker (Iterator[Tuple[os.DirEntry, str]]): The entries and their paths relative to the source.
+        dest (str): The destination directory path.
+
+    Returns:
+        Iterator[Tuple[os.DirEntry, str, bool]]: The entries that aren't directories, their destination paths
+            and whether the destination is known to be missing because its parent was created by this walk.
+    """
+    created: Set[str] = set()  # the relative paths of the directories created by this walk
+    prefix = _dir_prefix(dest)
+    for dir_entry, rel_path in walker:
+        dest_path = prefix + rel_path
+        if not dir_entry.is_dir():
+            yield dir_entry, dest_path, rel_path.rpartition(os.sep)[0] in created
+            continue
+        # the walk is top-down, so the parent already exists and a single mkdir is enough.
+        try:
+            os.mkdir(dest_path)
+        except FileExistsError:
+            continue
+        created.add(rel_path)
 
 
 def _copy_recursively(src: str, dest: str, mode: int=F_REPLACE) -> None:
@@ -140,16 +312,54 @@ def _copy_recursively(src: str, dest: str, mode: int=F_REPLACE) -> None:
     """
     if not os.path.isdir(src):
         return
-    for root, folders, files in os.walk(src):
-        for folder in folders:
-            src_folder = os.path.join(root, folder)
-            dest_folder = os.path.join(dest, os.path.relpath(src_folder, src))
-            if not os.path.exists(dest_folder):
-                os.makedirs(dest_folder)
-        for file in files:
-            src_file = os.path.join(root, file)
-            dest_file = os.path.join(dest, os.path.relpath(src_file, src))
-            _copyfile(src_file, dest_file, mode)
+    # the mode is decoded once, rather than per file
+    policy = _exists_policy(mode)
+    if not mode & F_PARALLEL:
+        for dir_entry, dest_path, dest_missing in _walk_dirs_first(_scan_tree(src), dest):
+            _copyfile_entry(dir_entry, dest_path, mode, dest_missing, policy)
+        return
+
+    workers = _parallel_workers()
+    # the files are copied by the pool while the walker keeps enumerating
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_copyfile_entry, dir_entry, dest_path, mode, dest_missing, policy)
+                   for dir_entry, dest_path, dest_missing in _walk_dirs_first(parallel_walk(src, workers), dest)]
+        # wait for all the copies to surface the exceptions
+        for future in futures:
+            future.result()
+
+
+def _glob_affix(pattern: str) -> Optional[List[str]]:
+    """Globs a pattern whose only magic is a single '*' at the start or end of the last part, such as '/path/*.txt'.
+
+    The directory is scanned once and the names are matched by str.startswith and str.endswith,
+    rather than by the regex fnmatch translates the pattern into.
+    Like glob.glob, the names starting with '.' are only matched by a pattern starting with '.'.
+
+    Args:
+        pattern (str): The glob pattern.
+
+    Returns:
+        Optional[List[str]]: The matched paths, or None if the pattern isn't that simple,
+            or the platform matches names case-insensitively.
+    """
+    dirname, basename = os.path.split(pattern)
+    if _IS_WINDOWS or not _GLOB_META.isdisjoint(dirname) or "[" in dirname or basename.count("*") != 1:
+        return None
+    if "?" in basename or "[" in basename or basename[0] != "*" and basename[-1] != "*":
+        return None
+    head, _, tail = basename.partition("*")  # one of them is empty
+    hidden = basename.startswith(".")
+    try:
+        with os.scandir(dirname or os.curdir) as it:
+            names = [e.name for e in it
+                     if e.name.startswith(head) and e.name.endswith(tail) and (hidden or e.name[0] != ".")]
+    except OSError:  # like glob.glob, a directory which can't be scanned matches nothing
+        return []
+    if not dirname:
+        return names
+    prefix = _dir_prefix(dirname)
+    return [prefix + name for name in names]
 
 
 def entry(src: Paths,
@@ -176,17 +386,21 @@ def entry(src: Paths,
         TypeError: If the type of 'src' is not one of Paths.
     """
     if mode & unsupported_mode:
-        raise UnsupportedModeError(
-            f"Unsupported mode: '{VALUE2NAME.get(unsupported_mode, 'Unknown')}:{unsupported_mode}'")
+        bits = mode & unsupported_mode
+        names = "|".join(FLAG_NAMES[bit] if bit < len(FLAG_NAMES) else 'Unknown'
+                         for bit in range(bits.bit_length()) if bits >> bit & 1)
+        raise UnsupportedModeError(f"Unsupported mode: '{names}:{bits}'")
 
     if mode & F_TARGET_DIRECTORY and not (isinstance(src, (List, Set))):
         raise InvalidArgType("Only List or Set type is allowed when F_TARGET_DIRECTORY is set.")
 
     if isinstance(src, str):
-        if "*" in src or "?" in src:
-            paths = glob.glob(src, recursive=bool(mode & F_RECURSIVE))
-        else:
+        if _GLOB_META.isdisjoint(src):
             paths = [src]
+        else:
+            paths = _glob_affix(src)
+            if paths is None:
+                paths = glob.glob(src, recursive=bool(mode & F_RECURSIVE))
     elif isinstance(src, List):
         paths = src
     elif isinstance(src, Set):
@@ -222,8 +436,9 @@ def copy(src: Paths, dest: str, mode: int=F_REPLACE) -> None:
         '~/folder' -> '/tmp/folder/'.
             Recursively update each file with the same name when both F_UPDATE and F_RECURSIVE are set.
 
-    For src is a glob string.
+    For src is a glob string, which contains '*' or '?'.
         call 'glob.glob("/path/to/find/*.txt")' to search files, and iteratively copy them to 'dest'
+        A path with '[' but neither of them is copied as it is.
 
     For src is a List or Set.
         [file1, file2,file3] -> '/tmp/folder/'.
@@ -261,93 +476,217 @@ def _copy(src: str, dest: str, mode: int=F_REPLACE) -> None:
     """
     src = adaptive(src)
     dest = adaptive(dest)
-    if not os.access(src, os.R_OK):
-        raise PermissionError(f"Permission denied: {src}")
-    if not os.access(src, os.W_OK):
-        raise PermissionError(f"Permission denied: {dest}")
-
     if src == dest:
         raise ValueError("Source and destination are the same file.")
+    # the permissions are left to the os when src is read, only a missing src is caught before dest is generated
+    src_type = file_type(src)
+    if src_type == T_MISSING:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), src)
 
+    # the cached outcomes of cmpfile may be stale once anything is copied over
+    _clear_cache()
     _generate_dirs(dest)
 
-    # when target not exists, only two situations
-    if not os.path.exists(dest):
-        if os.path.isdir(src):
-            return _copytree(src=src, dest=dest, mode=mode)
-        return _copyfile(src=src, dest=dest, mode=mode)
+    dest_type = file_type(dest)
+    # folder -> not exists, folder/* -> folder/
+    if src_type == T_DIR and dest_type in (T_MISSING, T_DIR):
+        return _copytree(src=src, dest=dest, mode=mode, _normalized=True)
+    # file -> not exists, file -> folder/, file -> file
+    return _copyfile(src=src, dest=dest, mode=mode, _normalized=True)
+
+
+# region dest exists policies
+# Each policy is called when dest exists, removes it by 'remover' if needed, and returns whether to copy.
+# The stats of src and dest are passed if known, so a policy needing them doesn't stat again.
+ExistsPolicy = Callable[  # pylint: disable=invalid-name  # a type alias, not a class
+    [str, str, Optional[os.stat_result], Optional[os.stat_result], Callable[[str], None]], bool]
+# the policies share the signature of ExistsPolicy, whether they use each argument or not
+# pylint: disable=unused-argument
+
+
+def _exists_noset(_src: str, _dest: str, _src_stat: Optional[os.stat_result], _dest_stat: Optional[os.stat_result],
+                  _remover: Callable[[str], None]) -> bool:
+    """Copies over dest as it is.
+
+    Returns:
+        bool: Always True.
+    """
+    return True
+
+
+def _exists_replace(_src: str, dest: str, _src_stat: Optional[os.stat_result], _dest_stat: Optional[os.stat_result],
+                    remover: Callable[[str], None]) -> bool:
+    """Removes dest, then copies.
+
+    Args:
+        dest (str): The existing destination path.
+        remover (Callable[[str], None]): Removes dest.
+
+    Returns:
+        bool: Always True.
+    """
+    remover(dest)
+    return True
+
+
+def _exists_update(src: str, dest: str, src_stat: Optional[os.stat_result], dest_stat: Optional[os.stat_result],
+                   remover: Callable[[str], None]) -> bool:
+    """Removes dest and copies only if src is newer.
+
+    Args:
+        src (str): The source path.
+        dest (str): The existing destination path.
+        src_stat (os.stat_result, optional): The stat of src if known.
+        dest_stat (os.stat_result, optional): The stat of dest if known.
+        remover (Callable[[str], None]): Removes dest.
+
+    Returns:
+        bool: True if src is newer than dest.
+    """
+    # integer nanoseconds, a float mtime loses precision and may see a newer src as the same age
+    if (src_stat or os.stat(src)).st_mtime_ns <= (dest_stat or os.stat(dest)).st_mtime_ns:
+        return False
+    remover(dest)
+    return True
+
+
+def _exists_ignore(_src: str, _dest: str, _src_stat: Optional[os.stat_result], _dest_stat: Optional[os.stat_result],
+                   _remover: Callable[[str], None]) -> bool:
+    """Keeps dest.
+
+    Returns:
+        bool: Always False.
+    """
+    return False
+# pylint: enable=unused-argument
+
+
+# indexed by _exists_index(mode), F_REPLACE is preferred to F_UPDATE, and F_UPDATE to F_IGNORE
+_DEST_EXISTS_DISPATCH = (
+    _exists_noset,  # 0
+    _exists_replace,  # F_REPLACE
+    _exists_ignore,  # F_IGNORE
+    _exists_replace,  # F_REPLACE | F_IGNORE
+    _exists_update,  # F_UPDATE
+    _exists_replace,  # F_REPLACE | F_UPDATE
+    _exists_update,  # F_UPDATE | F_IGNORE
+    _exists_replace,  # F_REPLACE | F_UPDATE | F_IGNORE
+)
+
+
+def _exists_index(mode: int) -> int:
+    """Packs F_REPLACE, F_IGNORE and F_UPDATE of mode into the index of _DEST_EXISTS_DISPATCH."""
+    return (mode & (F_REPLACE | F_IGNORE)) | ((mode & F_UPDATE) >> 1)
+
 
-    # when target exists, three situations
-    if os.path.isdir(dest):
-        # folder/* -> folder/
-        if os.path.isdir(src):
-            return _copytree(src=src, dest=dest, mode=mode)
-        # file -> folder/
-        return _copyfile(src=src, dest=dest, mode=mode)
-    # file -> file
-    return _copyfile(src=src, dest=dest, mode=mode)
+def _exists_policy(mode: int) -> ExistsPolicy:
+    """Gets the dest exists policy of mode."""
+    return _DEST_EXISTS_DISPATCH[_exists_index(mode)]
 
+# endregion dest exists policies
 
-def _copyfile(src: str, dest: str, mode: int=F_REPLACE) -> None:
+
+def _copyfile(src: str, dest: str, mode: int=F_REPLACE, src_stat: Optional[os.stat_result] = None,
+              policy: Optional[ExistsPolicy] = None, *, _normalized: bool = False) -> None:
     """ Copies a file from a source path to a destination path.
 
     Args:
         src (str): The source file or directory path to copy.
         dest (str): The destination path where to copy the source file or directory.
         mode (int): The mode of copying.
+        src_stat (os.stat_result, optional): The stat of src if known, saves a stat when F_UPDATE is set.
+        policy (ExistsPolicy, optional): The dest exists policy of mode if known, it's looked up by mode otherwise.
+        _normalized (bool, optional): Whether src and dest are already normalized by 'adaptive'.
 
     Returns:
         None
     """
-    src = adaptive(src)
-    dest = adaptive(dest)
-    if os.path.isdir(dest):
-        dest = os.path.join(dest, os.path.basename(src))
-
-    if os.path.exists(dest):
-        if mode & F_REPLACE:
-            os.remove(dest)
-        elif mode & F_UPDATE:
-            if os.path.getmtime(src) <= os.path.getmtime(dest):
-                return
-            os.remove(dest)
-        elif mode & F_IGNORE:
+    if not _normalized:
+        src = adaptive(src)
+        dest = adaptive(dest)
+    policy = policy or _exists_policy(mode)
+    if policy is _exists_update:
+        # the mtime of dest is needed anyway, so a full stat tells whether it exists and is a directory as well
+        dest_stat = stat_or_none(dest)
+        if dest_stat is not None and stat.S_ISDIR(dest_stat.st_mode):
+            dest = os.path.join(dest, src.rpartition(os.sep)[2])
+            dest_stat = stat_or_none(dest)
+        if dest_stat is not None and not policy(src, dest, src_stat, dest_stat, os.remove):
+            return
+    else:
+        dest_type = file_type(dest)
+        if dest_type == T_DIR:
+            dest = os.path.join(dest, src.rpartition(os.sep)[2])
+            dest_type = file_type(dest)
+        if dest_type != T_MISSING and not policy(src, dest, src_stat, None, os.remove):
             return
     try:
-        shutil.copy2(src, dest)
+        copy_data(src, dest)
     except (shutil.Error, PermissionError, OSError):
-        _copy_by_command(src, dest)
+        _copy_data_only(src, dest)
 
 
-def _copytree(src: str, dest: str, mode: int=F_REPLACE) -> None:
+def _copytree(src: str, dest: str, mode: int=F_REPLACE, *, _normalized: bool = False) -> None:
     """
     Copies a directory from a source path to a destination path.
     Args:
         src (str): The source file or directory path to copy.
         dest (str): The destination path where to copy the source file or directory.
         mode (int): The mode of copying.
+        _normalized (bool, optional): Whether src and dest are already normalized by 'adaptive'.
 
     Returns:
         None
     """
-    src = adaptive(src)
-    dest = adaptive(dest)
-    if os.path.exists(dest):
-        if mode & F_RECURSIVE:
+    if not _normalized:
+        src = adaptive(src)
+        dest = adaptive(dest)
+    if file_type(dest) != T_MISSING:
+        policy = _exists_policy(mode)
+        # F_UPDATE compares each file by its own mtime, rather than removing and copying the whole tree again
+        if mode & F_RECURSIVE or policy is _exists_update:
             _copy_recursively(src, dest, mode)
             return
-        if mode & F_REPLACE:
-            remove(dest)
-        elif mode & F_UPDATE:
-            if os.path.getmtime(src) <= os.path.getmtime(dest):
-                return
-            remove(dest)
-        elif mode & F_IGNORE:
+        # not the public remove, which would glob dest again
+        if not policy(src, dest, None, None, _remove):
             return
     try:
         shutil.copytree(src, dest)
     except (shutil.Error, PermissionError):
-        _copy_by_command(src, dest)
+        _copy_data_only(src, dest)
+
+
+def _rmtree_parallel(path: str) -> None:
+    """Removes a directory tree like shutil.rmtree, but unlinks its files by a thread pool.
+
+    The files are unlinked while the tree is still being walked,
+    then the directories are removed deepest first once they are empty.
+
+    Args:
+        path (str): The directory to remove.
+
+    Raises:
+        OSError: If an entry can't be removed.
+
+    Returns:
+        None
+    """
+    workers = _parallel_workers()
+    dirs: List[str] = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for dir_entry, _ in parallel_walk(path, workers):
+            # a link to a directory is unlinked itself, like rmtree
+            if dir_entry.is_dir(follow_symlinks=False):
+                dirs.append(dir_entry.path)
+            else:
+                futures.append(executor.submit(os.unlink, dir_entry.path))
+        # wait for all the unlinks to surface the exceptions
+        for future in futures:
+            future.result()
+    for directory in sorted(dirs, key=lambda d: d.count(os.sep), reverse=True):
+        os.rmdir(directory)
+    os.rmdir(path)
 
 
 def _remove(path: str, dest: str="", mode: int=F_NOSET) -> None:
@@ -364,28 +703,29 @@ def _remove(path: str, dest: str="", mode: int=F_NOSET) -> None:
         raise InvalidArgType("Unsupported arg 'dest'")
     # when remove mode not set, both file and directory will be removed.
     if not mode & F_RM_DIR and not mode & F_RM_FILE:
-        mode = F_RM_FILE | F_RM_DIR
+        mode = F_RM_FILE | F_RM_DIR | (mode & F_PARALLEL)
 
     # when use -d --dir, delete the path when it is dir and empty
     if mode & F_RM_EMPTY:
         mode = F_RM_EMPTY
 
-    win_divers_pattern = re.compile(r'^[a-zA-Z]+:[/\\]+$')
     path = adaptive(path)
-    if PLATFORM == WINDOWS and win_divers_pattern.search(path):
-        raise FileRemoveError(f"Can't remove windows driver: '{path}'")
-    if PLATFORM == UNIX and path.strip() == "/":
-        raise FileRemoveError("Can't remove the unix root '/'")
-    if os.path.isdir(path):
+    _check_root(path)
+    _clear_cache()
+    path_type = file_type(path, follow_symlinks=False)
+    if path_type == T_DIR:
         if mode & F_RM_EMPTY and len(os.listdir(path)) == 0:
-            os.remove(path)
+            os.rmdir(path)
             return
-        if mode & F_RM_DIR:
+        if mode & F_RM_DIR and mode & F_PARALLEL:
+            _rmtree_parallel(path)
+        elif mode & F_RM_DIR:
             shutil.rmtree(path)
-    elif os.path.isfile(path) and mode & F_RM_FILE:
+    # like rm, a link is removed itself rather than its target
+    elif path_type in (T_FILE, T_LINK) and mode & F_RM_FILE:
         os.remove(path)
-    else:  # link, maybe don't raise error?
-        raise FileRemoveError(f"Can't remove file '{path}'{os.stat(path)}")
+    else:
+        raise FileRemoveError(f"Can't remove file '{path}'{os.lstat(path)}")
 
 
 def remove(src: Paths, mode: int=F_NOSET) -> None:
@@ -412,6 +752,45 @@ def remove(src: Paths, mode: int=F_NOSET) -> None:
     return entry(src, "", mode, unsupported_mode=F_REPLACE | F_UPDATE | F_IGNORE | F_TARGET_DIRECTORY, func=_remove)
 
 
+def _move_by_rename(src: str, dest: str) -> bool:
+    """Moves src to dest by a single rename, when both are on the same filesystem.
+
+    Only the cases a rename does the same as copying and removing are handled here:
+    src to a missing dest, a file over a file, and a file into a directory.
+    A directory over an existing path is left to _copy, which merges or replaces it according to the mode.
+
+    Args:
+        src (str): The source file or directory path to move.
+        dest (str): The destination path where to move the source file or directory.
+
+    Raises:
+        OSError: If the rename fails for another reason than crossing filesystems.
+
+    Returns:
+        bool: True if src is moved, False if it must be copied and removed.
+    """
+    src = adaptive(src)
+    dest = adaptive(dest)
+    src_type = file_type(src, follow_symlinks=False)
+    dest_type = file_type(dest)
+    if dest_type == T_DIR and src_type != T_DIR:
+        # file -> folder/, the same as _copyfile
+        dest = os.path.join(dest, src.rpartition(os.sep)[2])
+        dest_type = file_type(dest)
+    if src_type == T_MISSING or dest_type == T_DIR or (src_type == T_DIR and dest_type != T_MISSING):
+        return False
+
+    _generate_dirs(dest)
+    try:
+        os.replace(src, dest)
+    except OSError as err:
+        if err.errno == errno.EXDEV:
+            return False
+        raise
+    _clear_cache()
+    return True
+
+
 def _move(src: str, dest: str, mode: int=F_FORCE) -> None:
     """ Moves a file or directory from a source path to a destination path.
 
@@ -429,17 +808,20 @@ def _move(src: str, dest: str, mode: int=F_FORCE) -> None:
 
     # in the same directory
     if os.path.dirname(src) == os.path.dirname(dest):
-        _sig_src: Tuple = _sig(src)
-        _sig_dest: Tuple = _sig(dest)
-        if _sig_src[0] != _sig_dest[0] and not mode & F_RECURSIVE:
-            _cache.clear()
+        src_type = file_type(src)
+        dest_type = file_type(dest)
+        if dest_type not in (T_MISSING, src_type) and not mode & F_RECURSIVE:
             raise FileMoveError(f"Can't move '{src}' to '{dest}': Different file type.")
-        _cache.clear()
-        _remove(dest, mode=mode)
-        os.rename(src, dest)
+        _clear_cache()
+        # a file is replaced atomically, but a rename can't replace a directory unless it's empty
+        if dest_type == T_DIR or (src_type == T_DIR and dest_type != T_MISSING):
+            _remove(dest, mode=mode)
+        os.replace(src, dest)
+        return
+    if _move_by_rename(src, dest):
         return
     _copy(src, dest, mode)
-    _remove(src, dest, mode=mode)
+    _remove(src, mode=mode)
 
 
 def move(src: Paths, dest: str, mode: int=F_FORCE) -> None:
@@ -462,14 +844,25 @@ def move(src: Paths, dest: str, mode: int=F_FORCE) -> None:
     return entry(src, dest, mode, unsupported_mode=F_RM_DIR | F_RM_FILE | F_RM_EMPTY, func=_move)
 
 
-def _grep_file(anchor: str, regex: Pattern, index: int, encoding='utf-8') -> List[str]:
+@functools.lru_cache(maxsize=256)
+def _compile_regex(regex: str) -> Pattern:
+    """Compiles a string regex of grep once, the same regexes are often grepped against many anchors."""
+    return re.compile(regex)
+
+
+def _grep_file(anchor: str, regex: Pattern, index: int, encoding='utf-8', engine: str="re") -> List[str]:
     """
-    Searches for a regex pattern within a file.
+    Searches for a regex pattern within a file, line by line.
+
+    With the hyperscan engine, the file is read by blocks of whole lines,
+    and the lines of a block are only searched when the prefilter may match the block.
 
     Args:
         anchor (str): The path to the file to be searched.
         regex (Pattern): The regex pattern to search for.
         index (int): If positive, returns the matching group. If negative, returns all matches.
+        encoding (str, optional): default utf-8
+        engine (str, optional): One of _GREP_ENGINES. Defaults to "re".
 
     Returns:
         List[str]: A list of matching strings.
@@ -477,26 +870,60 @@ def _grep_file(anchor: str, regex: Pattern, index: int, encoding='utf-8') -> Lis
     """
     found: List[str] = []
 
-    pattern = regex
-    if isinstance(regex, str):
-        pattern = re.compile(regex)
+    pattern = _compile_regex(regex) if isinstance(regex, str) else regex
+    may_match = prefilter(pattern) if engine == "hyperscan" else None
 
     with open(anchor, 'r', encoding=encoding, errors='ignore') as fp:
-        for line in fp:
-            if index < 0:
-                found.extend(pattern.findall(line))
-                continue
-            match = pattern.search(line)
-            if not match:
-                continue
-            found.append(match.group(index))
+        if may_match is None:
+            _search_lines(pattern, fp, index, found)
+            return found
+        for block in _line_blocks(fp):
+            if may_match(block):
+                # split at '\n' only, like the lines of fp
+                _search_lines(pattern, io.StringIO(block, newline='\n'), index, found)
     return found
 
 
+def _line_blocks(fp) -> Iterator[str]:
+    """Reads a text file by blocks of about _GREP_BLOCK chars, each one cut after its last '\\n'.
+
+    A line longer than a block is collected piece by piece, and joined once when it ends.
+    """
+    pieces: List[str] = []  # the line not ended by the previous blocks
+    while True:
+        chunk = fp.read(_GREP_BLOCK)
+        if not chunk:
+            if pieces:
+                yield ''.join(pieces)
+            return
+        cut = chunk.rfind('\n') + 1
+        if not cut:
+            pieces.append(chunk)
+            continue
+        pieces.append(chunk[:cut])
+        yield ''.join(pieces)
+        pieces = [chunk[cut:]] if cut < len(chunk) else []
+
+
+def _search_lines(pattern: re.Pattern, lines: Iterable[str], index: int, found: List[str]) -> None:
+    """Searches each line by itself, appends all its matches to found if index is negative,
+    or the group 'index' of its first match otherwise."""
+    if index < 0:
+        for line in lines:
+            found.extend(pattern.findall(line))
+        return
+    for line in lines:
+        match = pattern.search(line)
+        if match:
+            found.append(match.group(index))
+
+
 def _grep_string(anchor: str, regex: Pattern, index: int) -> List[str]:
     """
     Searches for a regex pattern within a string.
 
+    Each line is matched by itself, with the lines split at '\\n', '\\r\\n' and '\\r'.
+
     Args:
         anchor (str): The string to be searched.
         regex (Pattern): The regex pattern to search for.
@@ -508,22 +935,19 @@ def _grep_string(anchor: str, regex: Pattern, index: int) -> List[str]:
     """
     found: List[str] = []
 
-    pattern = regex
-    if isinstance(regex, str):
-        pattern = re.compile(regex)
-
-    for line in anchor.splitlines():
-        if index < 0:
+    pattern = _compile_regex(regex) if isinstance(regex, str) else regex
+    if index < 0:
+        for line in anchor.splitlines():
             found.extend(pattern.findall(line))
-            continue
+        return found
+    for line in anchor.splitlines():
         match = pattern.match(line)
-        if not match:
-            continue
-        found.append(match.group(index))
+        if match:
+            found.append(match.group(index))
     return found
 
 
-def grep(anchor: str, regex: Pattern, index=0, encoding='utf-8') -> List[str]:
+def grep(anchor: str, regex: Pattern, index=0, encoding='utf-8', engine: str="re") -> List[str]:
     """
     Searches for a regex pattern within a string or a file.
 
@@ -534,36 +958,46 @@ def grep(anchor: str, regex: Pattern, index=0, encoding='utf-8') -> List[str]:
         regex (Pattern): The regex pattern to search for.
         index (int, optional): If positive, returns the matching group. If negative, returns all matches. Defaults to 0.
         encoding (str, optional): default utf-8
-        
+        engine (str, optional): "re" or "hyperscan". Defaults to "re".
+            "hyperscan" prefilters the blocks of a file by the optional 'hyperscan' package,
+            then searches the blocks may match by 're', so the results are the same.
+            It is ignored when grepping a string, or when hyperscan isn't installed or can't compile the regex.
+
     Returns:
         List[str]: A list of matching strings.
 
     Raises:
         InvalidArgType: If the anchor is a file-path-like string, but the file does not exist or is not a file.
+            Or if the engine is unknown.
 
     """
+    if engine not in _GREP_ENGINES:
+        raise InvalidArgType(f"Unknown grep engine '{engine}', must be one of {_GREP_ENGINES}")
     if len(anchor) > WINDOWS_MAX_PATH:
         anchor = anchor[:WINDOWS_MAX_PATH]
     if is_filepath(anchor):
         if os.path.isfile(anchor):
-            return _grep_file(anchor, regex, index, encoding=encoding)
+            return _grep_file(anchor, regex, index, encoding=encoding, engine=engine)
         raise InvalidArgType("The path '%s' is not a file or its not found." % anchor)
     return _grep_string(anchor, regex, index)
 
 
-def _sig(file) -> Tuple[int, int, float]:
+def _sig(file) -> Tuple[int, int, float, int, int]:
     """Get the signature of a file.
 
     Args:
         file (str): The file to get the signature of.
 
     Returns:
-        Tuple[int, int, float]: A tuple containing the file type, size, and modification time.
+        Tuple[int, int, float, int, int]: A tuple containing the file type, size, modification time,
+            and the device and inode identifying the file. Only the first three describe the content.
     """
     st = os.stat(file)
     sign = (stat.S_IFMT(st.st_mode),
             st.st_size,
-            st.st_mtime)
+            st.st_mtime,
+            st.st_dev,
+            st.st_ino)
     return sign
 
 
@@ -608,27 +1042,40 @@ def cmpfile(file1: str, file2: str, mode: int) -> bool:
     if s1[0] != stat.S_IFREG or s2[0] != stat.S_IFREG:
         raise InvalidArgType("Can't compare non-regular files.")
 
-    if s2 == s1 and mode & C_SHALLOW and not mode & C_BINARY:
+    # the same inode, such as hard links or bind mounts, has the same content. st_ino is 0 if unsupported.
+    if s1[3:] == s2[3:] and s1[4]:
         return True
 
-    outcome = _cache.get((file1, file2, s1, s2))
-    if outcome is not None:
-        return outcome
+    if s2[:3] == s1[:3] and mode & C_SHALLOW and not mode & C_BINARY:
+        return True
 
     if mode & C_BINARY:
-        # when compare binary ,shallow means whether the file1 is in file2
+        # when compare binary ,shallow means whether the file1 is in file2.
+        # the sizes alone decide these, before the cache is looked up or any file is opened.
         if s1[1] != s2[1] and not mode & C_SHALLOW:
             return False
         if s1[1] > s2[1]:
             return False
+
+    key = (s1, s2, mode)
+    with _cache_lock:
+        outcome = _cache.get(key)
+        if outcome is not None:
+            _cache.move_to_end(key)
+            return outcome
+
+    if mode & C_BINARY:
         outcome = _cmp_binaries(file1, file2)
 
     if mode & C_TEXT:
-        outcome = _cmp_text(file1, file2, mode)
+        # identical bytes are the same text whatever the flags, and are compared without decoding a line.
+        # only the files of the same size may be identical, the others are decoded straight away.
+        outcome = (s1[1] == s2[1] and _cmp_binaries(file1, file2)) or _cmp_text(file1, file2, mode)
 
-    if len(_cache) > _CACHE_MAX_LEN:
-        _cache.clear()
-    _cache[(file1, file2, s1, s2)] = outcome
+    with _cache_lock:
+        _cache[key] = outcome
+        if len(_cache) > _CACHE_MAX_LEN:
+            _cache.popitem(last=False)
 
     return outcome
 
@@ -643,14 +1090,25 @@ def _cmp_binaries(file1: str, file2: str) -> bool:
     Returns:
         bool: True if the binary files are the same, False otherwise.
     """
-    with open(file1, 'rb') as f1, open(file2, 'rb') as f2:
-        while f1.readable():
-            b1 = f1.read(BUFFER_SIZE)
-            b2 = f2.read(len(b1))
-            if b1 != b2:
-                return False
-            if not b1:
-                return True
+    # raw descriptors, so the data isn't copied through the buffer of a file object as well
+    fd1 = os.open(file1, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        fd2 = os.open(file2, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd1, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                os.posix_fadvise(fd2, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while True:
+                # a read of a regular file only returns less than asked at the end of file
+                b1 = os.read(fd1, BUFFER_SIZE)
+                if b1 != os.read(fd2, len(b1)):
+                    return False
+                if not b1:
+                    return True
+        finally:
+            os.close(fd2)
+    finally:
+        os.close(fd1)
 
 
 def _cmp_text(file1: str, file2: str, mode: int) -> bool:
@@ -679,10 +1137,14 @@ def _cmp_text(file1: str, file2: str, mode: int) -> bool:
 def cmpdir(dir1: str, dir2: str, mode: int) -> bool:
     """Compare two directories.
 
+    With F_PARALLEL, the files are compared by a thread pool while dir1 is still being walked,
+    the reads and the comparisons of the byte strings release the GIL.
+    The first difference found cancels the compares not started yet.
+
     Args:
         dir1 (str): The first directory to compare.
         dir2 (str): The second directory to compare.
-        mode (int): The mode to use for comparison.
+        mode (int): The mode to use for comparison, the same as cmpfile and F_PARALLEL.
 
     Returns:
         bool: True if the directories are the same, False otherwise.
@@ -691,10 +1153,41 @@ def cmpdir(dir1: str, dir2: str, mode: int) -> bool:
         return True
     if not os.path.isdir(dir1) or not os.path.isdir(dir2):
         return False
-    for root, dirs, files in os.walk(dir1):
-        for file in files:
-            src = os.path.join(root, file)
-            dest = os.path.join(dir2, os.path.relpath(src, dir1))
-            if not cmpfile(src, dest, mode):
+    prefix = _dir_prefix(dir2)
+    if not mode & F_PARALLEL:
+        for dir_entry, rel_path in _scan_tree(dir1):
+            # like the files of os.walk, a link to a directory counts as a directory
+            if dir_entry.is_dir():
+                continue
+            if not _cmp_counterpart(dir_entry.path, prefix + rel_path, mode):
+                return False
+        return True
+
+    mode &= ~F_PARALLEL  # the outcomes are cached by the compare mode only
+    workers = _parallel_workers()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_cmp_counterpart, dir_entry.path, prefix + rel_path, mode)
+                   for dir_entry, rel_path in parallel_walk(dir1, workers) if not dir_entry.is_dir()]
+        for future in as_completed(futures):
+            if not future.result():
+                for pending in futures:
+                    pending.cancel()
                 return False
     return True
+
+
+def _cmp_counterpart(file1: str, file2: str, mode: int) -> bool:
+    """Compare a file of cmpdir with its counterpart.
+
+    Args:
+        file1 (str): The file in the first directory.
+        file2 (str): The file at the same relative path in the second directory.
+        mode (int): The mode to use for comparison.
+
+    Returns:
+        bool: True if the files are the same, False if they differ or file2 is not found.
+    """
+    try:
+        return cmpfile(file1, file2, mode)
+    except FileNotFoundError:  # no counterpart in dir2, found by the stat of cmpfile rather than another one
+        return False
@@ -1,5 +1,5 @@
 import re
-from typing import overload, List, Set, Union, Dict, Type
+from typing import overload, List, Set, Union, Dict, Tuple, Type
 
 # region Global define
 F_NOSET: int
@@ -13,10 +13,12 @@ F_RM_DIR: int  # for only remove directory
 F_RM_FILE: int  # for only remove file
 F_RM_EMPTY: int  # -d --dir. remove empty
 F_REPLACE: int
+F_PARALLEL: int  # walk and copy, remove or compare directories with a thread pool
 
 # endregion Global define
 
 VALUE2NAME: Dict[int, str]
+FLAG_NAMES: Tuple[str, ...]
 NAME2VALUE: Dict[str, int]
 
 # region Type Alias
@@ -62,7 +64,7 @@ def move(src: List, dest: str, mode: int = F_FORCE) -> None: ...
 def move(src: Set, dest: str, mode: int = F_FORCE) -> None: ...
 
 
-def grep(anchor: str, pattern: Pattern, index=-1) -> List[str]: ...
+def grep(anchor: str, pattern: Pattern, index=-1, encoding: str = 'utf-8', engine: str = 're') -> List[str]: ...
 
 
 def cmpfile(file1, file2, buffer:int) -> bool: ...
@@ -6,15 +6,34 @@ Functions:
     windows: Converts a path to a Windows-compatible path.
     unix: Converts a path to a Unix-compatible path.
     adaptive: Converts a path to a platform-compatible path based on the current operating system.
+    parallel_walk: Walks a directory tree with a pool of threads.
 """
 
+import functools
 import logging
 import os
+import queue
 import re
+import threading
+from typing import Iterator, Tuple
 
 from .defines import WINDOWS, PLATFORM, WINDOWS_MAX_PATH
 from .errors import ParameterError
 
+_PATH_CACHE_MAX_LEN = 8192  # the max length of the windows/unix caches
+_WIN_COLON_RE_1 = re.compile(r"(?<!/):(\\+)?")
+_WIN_COLON_RE_2 = re.compile(r"(?<!/):")
+_UNC_RE = re.compile(r'^\\\\\?(\\UNC)?')
+# the file path regex of the platform, picked once.
+# each char can only be matched by one part of a pattern, so a long string that doesn't match fails in linear time.
+if PLATFORM == WINDOWS:
+    _FILEPATH_RE = re.compile(
+        r"(?:[a-zA-Z]:\\|\\\\\?\\UNC|\\\\[\w.?]+\\[\w.$?]+)(?:[\w\-]+\\)*[\w\-][\w\-.]+$")
+    _FILEPATH_MAX_LEN = 32767  # the max length of an extended-length path
+else:
+    _FILEPATH_RE = re.compile(r"^/?[a-zA-Z0-9_.-]+(?:/[a-zA-Z0-9_.-]+)*/?$")
+    _FILEPATH_MAX_LEN = 4096  # PATH_MAX of linux
+
 
 def touncpath(path, maximum=WINDOWS_MAX_PATH):
     """This function is used to handle the maximum path length issue in Windows.
@@ -31,7 +50,7 @@ def touncpath(path, maximum=WINDOWS_MAX_PATH):
     if PLATFORM != WINDOWS:
         logging.warning("This 'touncpath' function is only for Windows OS.")
         return path
-    if re.search(r'^\\\\\?(\\UNC)?', path):
+    if _UNC_RE.search(path):
         return path
     if len(path) > maximum:
         if path.startswith(r"\\"):
@@ -41,6 +60,7 @@ def touncpath(path, maximum=WINDOWS_MAX_PATH):
     return path
 
 
+@functools.lru_cache(maxsize=_PATH_CACHE_MAX_LEN)
 def windows(path: str):
     # when path-split quote not exists, raise an error
     if "/" not in path and "\\" not in path:
@@ -49,8 +69,8 @@ def windows(path: str):
     # when the step at before removes the \\, add it.
     if path.startswith(r"\\") and not result.startswith(r"\\"):
         result = r"\\" + result
-    result = re.sub(r"(?<!/):(\\+)?", ":", result)
-    result = re.sub(r"(?<!/):", r":\\", result)
+    result = _WIN_COLON_RE_1.sub(":", result)
+    result = _WIN_COLON_RE_2.sub(r":\\", result)
     # deal with a long path
     if len(result) > WINDOWS_MAX_PATH:
         result = touncpath(result)
@@ -59,6 +79,7 @@ def windows(path: str):
     return result
 
 
+@functools.lru_cache(maxsize=_PATH_CACHE_MAX_LEN)
 def unix(path: str):
     if "/" not in path and "\\" not in path:
         raise ParameterError(f"Path '{path}' is not a valid path.")
@@ -66,17 +87,89 @@ def unix(path: str):
     return path
 
 
-def adaptive(path: str):
-    if PLATFORM == WINDOWS:
-        return windows(path)
-    return unix(path)
+# the platform is fixed for the process, so bind the right one once
+adaptive = windows if PLATFORM == WINDOWS else unix
 
 
 def is_filepath(anchor: str) -> bool:
+    # too long to be a path, such as the text grep searches. neither a stat nor the regex is needed
+    if len(anchor) > _FILEPATH_MAX_LEN:
+        return False
     if os.path.exists(anchor):
         return True
-    if PLATFORM == WINDOWS:
-        rgx = r"(^(?:[a-zA-Z]:\\)|(?:\\\\\?\\UNC)|(?:\\\\[\w.?]+\\[\w.$?]+))(?:[\w\-]+\\)*[\w\-]+([\w\-.])+$"
-    else:
-        rgx = r"^(/)?([a-zA-Z0-9_.-]+(/)?)+$"
-    return re.match(rgx, anchor) is not None
+    return _FILEPATH_RE.match(anchor) is not None
+
+
+def parallel_walk(top: str, workers: int = 0) -> Iterator[Tuple[os.DirEntry, str]]:
+    """Walks a directory tree with a pool of threads, in the manner of pwalk.
+
+    The workers share a LIFO of directories, each one pops a directory, scans it and pushes back its subdirectories.
+    Popping the newest directory first keeps the walk close to depth-first,
+    so the pending directories don't blow up like a breadth-first walk on wide trees.
+
+    The entries of a directory are always yielded before the entries of its subdirectories,
+    but the order between siblings is not defined. Like os.walk, symlinks to directories are not walked into.
+
+    Parameters:
+        top (str): The directory to walk.
+        workers (int): The number of threads. The Default value is 0, which means twice of the CPU count.
+
+    Raises:
+        OSError: If a directory can't be scanned.
+
+    Returns:
+        Iterator[Tuple[os.DirEntry, str]]: The entries and their paths relative to top.
+    """
+    workers = workers or 2 * (os.cpu_count() or 1)
+    dirs = queue.LifoQueue()
+    results = queue.Queue()
+    done = object()
+    stop = threading.Event()
+    lock = threading.Lock()
+    pending = [1]  # the directories queued or being scanned
+
+    def scan(path: str, prefix: str) -> None:
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError as err:
+            results.put(err)
+            return
+        # report the directory before its subdirectories can be scanned
+        results.put((prefix, entries))
+        for entry in entries:
+            if entry.is_dir() and not entry.is_symlink():
+                with lock:
+                    pending[0] += 1
+                dirs.put((entry.path, prefix + entry.name + os.sep))
+
+    def work() -> None:
+        while True:
+            item = dirs.get()
+            if item is None or stop.is_set():
+                return
+            scan(*item)
+            with lock:
+                pending[0] -= 1
+                finished = pending[0] == 0
+            if finished:
+                results.put(done)
+
+    dirs.put((top, ""))
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                return
+            if isinstance(item, OSError):
+                raise item
+            prefix, entries = item
+            for entry in entries:
+                yield entry, prefix + entry.name
+    finally:
+        stop.set()
+        for _ in threads:
+            dirs.put(None)